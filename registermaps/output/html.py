@@ -15,17 +15,45 @@ Where #sidebar is a navigation table-of-contents for the document, and
 
 from os import makedirs
 import os.path
-import datetime
+import functools
 from lxml.html import builder as E
 from lxml.html import tostring, Element
-from html import escape
 
 from ..visitor import Visitor
-from ..util import resource_text, printverbose, Outputs
+from ..util import resource_text, printverbose, Outputs, start_time
 
 CLASS = E.CLASS
 FOOTER = Element('footer')
 
+# The builder only reads the attribute dicts passed to it, so the class
+# attributes that recur on every node can be built once and shared.
+C_ADDRESS = CLASS('address')
+C_DESCRIPTION = CLASS('description')
+C_FIELDS = CLASS('fields')
+C_BIT_NUMBERS = CLASS('bit_numbers')
+C_STD_FIELD = CLASS('std_field')
+C_RESERVED_FIELD = CLASS('reserved_field')
+C_FIELDDEF = CLASS('fielddef')
+
+# Same five entities as html.escape(quote=True), but through a prebuilt
+# translation table so the scan runs entirely in C.
+_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;',
+})
+
+@functools.lru_cache(maxsize=1024)
+def escape(text):
+    """Escape HTML special characters in text.
+
+    Register and field names repeat across instance files, so cache
+    the escaped forms.
+    """
+    return text.translate(_ESCAPE_TABLE)
+
 def htmlpathjoin(*args):
     """Like os.path.join, but always uses /."""
     
@@ -107,7 +135,7 @@ class basic(Visitor):
             E.P(
                 "Generated automatically from {source} at {time:%d %b %Y %H:%M}.".format(
                     source = node.sourcefile,
-                    time = datetime.datetime.now()
+                    time = start_time
             )),
         )
         return footer
@@ -207,7 +235,7 @@ class basic(Visitor):
             prefix = self.offset,
             offset = offset,
             nibbles = self.address_nibbles
-            ), CLASS('address')
+            ), C_ADDRESS
         )
             
     def visit_RegisterArray(self, node):
@@ -222,7 +250,7 @@ class basic(Visitor):
             "Array of {} copies, repeats every {} bytes.".format(node.count, framebytes)
         ))
         for d in node.description:
-            root.append(E.P(d, CLASS('description')))
+            root.append(E.P(d, C_DESCRIPTION))
             
         with self.tempvars(offset='N*{}+'.format(framebytes), hlev=self.hlev+1):
             root.extend(self.visitchildren(node))
@@ -239,7 +267,7 @@ class basic(Visitor):
             ap,
             self.heading(node.name),
             CLASS('register'),
-            *[E.P(d, CLASS('description')) for d in node.description],
+            *[E.P(d, C_DESCRIPTION) for d in node.description],
             id="REG_" + node.name
         )
         
@@ -249,20 +277,20 @@ class basic(Visitor):
             rows = []
             for startbit in range(0, node.space.size, 16):
                 endbit = startbit + 16
-                row = E.TR(CLASS('fields'))
+                row = E.TR(C_FIELDS)
                 cells = []
                 for obj, start, size in node.space[startbit:endbit]:
                     if obj:
-                        cell = E.TD(obj.name, CLASS('std_field'))
+                        cell = E.TD(obj.name, C_STD_FIELD)
                     else:
-                        cell = E.TD('.', CLASS('reserved_field'))
+                        cell = E.TD('.', C_RESERVED_FIELD)
                     cell.attrib['colspan'] = str(size)
                     cells.append(cell)
                 row.extend(reversed(cells))
                 rows.append(row)
                 
                 rows.append(E.TR(
-                    CLASS('bit_numbers'),
+                    C_BIT_NUMBERS,
                     *[E.TD(str(n-1)) for n in range(endbit, startbit, -1)]
                 ))
             table.extend(reversed(rows))
@@ -294,11 +322,11 @@ class basic(Visitor):
         item = E.LI(
             E.P(
                 node.name + ' ',
-                E.SPAN(deftext, CLASS('fielddef'))
+                E.SPAN(deftext, C_FIELDDEF)
             )
         )
         for d in node.description:
-            item.append(E.P(d, CLASS('description')))
+            item.append(E.P(d, C_DESCRIPTION))
         
         if node.space:
             # We need a definitionlist for the enums
@@ -311,7 +339,7 @@ class basic(Visitor):
         """Return a list of DT/DD elements for the enum DL."""
         
         return (
-            [E.DT(node.name, E.SPAN(str(node.value), CLASS('address')))] + 
+            [E.DT(node.name, E.SPAN(str(node.value), C_ADDRESS))] + 
             [E.DD(d) for d in node.description]
         )
          
@@ -424,10 +452,13 @@ class basic(Visitor):
         )
         
     def finish(self, tree):
+        # Serialize once; only decode if the sink turns out to want text
+        # (e.g. stdout) rather than rendering the whole tree a second time.
+        data = tostring(tree, pretty_print=True)
         try:
-            self.write(tostring(tree, pretty_print=True))
+            self.write(data)
         except TypeError:
-            self.write(tostring(tree, pretty_print=True, encoding='unicode'))
+            self.write(data.decode('ascii'))
         
     @classmethod
     def preparedir(kls, directory):
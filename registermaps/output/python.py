@@ -11,10 +11,9 @@ components.
 """
 
 import textwrap
-import datetime
 import os
 from ..visitor import Visitor
-from ..util import Outputs
+from ..util import Outputs, start_time
 
 dedent = textwrap.dedent
 wrapper = textwrap.TextWrapper(
@@ -88,7 +87,7 @@ class basic(Visitor):
             name = node.name,
             desc = '\n\n'.join(wrapper.fill(d) for d in node.description),
             source = node.sourcefile,
-            time = datetime.datetime.now(),
+            time = start_time,
         )
         for line in header.splitlines():
             preamble = '##' if line.startswith('#') else '# '
@@ -4,6 +4,10 @@ import textwrap
 from ..visitor import Visitor
 from ..util import Outputs
 
+# Shared wrapper for description text; headline adjusts the indents
+# per call rather than building a new TextWrapper each time.
+wrapper = textwrap.TextWrapper(width = 100)
+
 @Outputs.register
 class tree(Visitor):
     
@@ -26,43 +30,35 @@ class tree(Visitor):
         self.print(oldindent + line)
         self.indent = newindent = oldindent + self.indentper
         
-        wrapper = textwrap.TextWrapper(
-            width = 100,
-            initial_indent = self.indent,
-            subsequent_indent = self.indent
-        )
+        wrapper.initial_indent = wrapper.subsequent_indent = self.indent
         for d in node.description:
-            for line in wrapper.wrap(d):
-                self.print(line)        
+            self.print(wrapper.fill(d))
         self.visitchildren(node)
 
         self.indent = oldindent
         
     def defaultvisit(self, node):
-        skipattrs = ['name', 'readOnly', 'writeOnly']
-        line = '{} {} ({}{})'.format(
-            type(node).__name__, node.name,
-            ','.join('{}={}'.format(k, v) for k, v in node._attrib.items() if k not in skipattrs),
-            self.rostat(node)
+        skipattrs = ('name', 'readOnly', 'writeOnly')
+        attrs = ','.join(
+            f'{k}={v}' for k, v in node._attrib.items() if k not in skipattrs
         )
+        line = f'{type(node).__name__} {node.name} ({attrs}{self.rostat(node)})'
         self.headline(line, node)
-        
+
     def visit_Component(self, node):
-        line = 'component {} (size={}{})'.format(node.name, node.size, self.rostat(node))
+        line = f'component {node.name} (size={node.size}{self.rostat(node)})'
         self.headline(line, node)
-        
+
     def visit_Register(self, node):
-        line = '({}) {} (reset={}{})'.format(
-            node.offset, node.name, node.reset, self.rostat(node)
-        )
+        line = f'({node.offset}) {node.name} (reset={node.reset}{self.rostat(node)})'
         self.headline(line, node)
-        
+
     def visit_Instance(self, node):
-        line = '({}) {} {}'.format(node.offset, node.extern, node.name)
+        line = f'({node.offset}) {node.extern} {node.name}'
         self.headline(line, node)
-        
+
     def visit_Enum(self, node):
-        line = '{} = {}'.format(node.name, node.value)
+        line = f'{node.name} = {node.value}'
         self.headline(line, node)
         
     def rostat(self, node):
@@ -21,9 +21,8 @@
 import os
 import os.path
 import textwrap
-import datetime
 from .. import xml_parser, textfn
-from ..util import printverbose, Outputs, jinja
+from ..util import printverbose, Outputs, jinja, start_time
 from ..visitor import Visitor
 
 class VhdlVisitor(Visitor):
@@ -43,23 +42,26 @@ def dedent(text):
 def register_format(element, index=True):
     if element.width == 1:
         return 'std_logic'
-    
-    fmt = {
-        'bits' : 'std_logic_vector',
-        'signed' : 'signed',
-        'unsigned' : 'unsigned'
-    }[element.format]
-    
+
+    # 'signed' and 'unsigned' are already the VHDL type names.
+    fmt = 'std_logic_vector' if element.format == 'bits' else element.format
+
     if index:
-        return '{0}({1} downto 0)'.format(fmt, element.width-1)
+        return f'{fmt}({element.width-1} downto 0)'
     else:
         return fmt
     
+# Comment bar shared by every commentblock call.
+CBAR = '-' * 80
+
+# One wrapper for all the file headers; constructing a TextWrapper
+# compiles regexes, so share it.
+wrapper = textwrap.TextWrapper()
+
 def commentblock(text):
     """Return text as a comment encased in comment bars."""
-    
-    cbar = '-' * 80
-    return '\n'.join((cbar, textwrap.indent(text.strip(), '--  ', lambda x: True), cbar))
+
+    return '\n'.join((CBAR, textwrap.indent(text.strip(), '--  ', lambda x: True), CBAR))
 
 #######################################################################
 # Helper visitors
@@ -149,7 +151,7 @@ class FixReservedWords(VhdlVisitor):
         # Sweep the children too
         changes.extend(
             (ctype, oldname + '.' + old, newname + '.' + new)
-                for childchanges in self.visitchildren(node)
+                for childchanges in self.iterchildren(node)
                 for ctype, old, new in childchanges
         )
         return changes
@@ -159,16 +161,14 @@ class FixReservedWords(VhdlVisitor):
 
 class GenerateAddressConstants(VhdlVisitor):
     """Print address constants into the package header."""
-        
-    def begin(self, startnode):
-        self.body = []
-    
+
     def visit_Component(self, node):
         maxaddr = node.size - 1
         self.print(commentblock('Address Constants'))
         self.printf('subtype t_addr is integer range 0 to {};', maxaddr)
         
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
         self.print('function GET_ADDR(address: std_logic_vector) return t_addr;')
         self.print('function GET_ADDR(address: unsigned) return t_addr;')
         
@@ -181,7 +181,8 @@ class GenerateAddressConstants(VhdlVisitor):
         )
         for name, val in consts:
             self.printaddress(node.name+name, val)
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
         
     def visit_Register(self, node):
         self.printaddress(node.name+'_ADDR', node.offset)
@@ -201,10 +202,7 @@ class GenerateTypes(VhdlVisitor):
     - Enumeration constants
     
     """
-    
-    def begin(self, startnode):
-        self.body = []
-    
+
     def namer(self, node):
         """Returns the appropriate type name for a given node."""
         if isinstance(node, xml_parser.Register):
@@ -221,7 +219,8 @@ class GenerateTypes(VhdlVisitor):
         self.printf('subtype t_busdata is std_logic_vector({} downto 0);', node.width-1)
         
         # First define all the registers and registerarrays
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
         
         # Now create a gestalt structure for the entire register file.
         self.printf('type t_{}_regfile is record', node.name)
@@ -232,7 +231,7 @@ class GenerateTypes(VhdlVisitor):
         # And a default for it.
         self.printf('constant RESET_t_{0}_REGFILE : t_{0}_regfile := (', node.name)
         lines = (
-            '    {0} => RESET_{1}'.format(child.identifier, self.namer(child))
+            f'    {child.identifier} => RESET_{self.namer(child)}'
             for child, _, _ in node.space.items()
         )
         self.print(',\n'.join(lines))
@@ -242,13 +241,14 @@ class GenerateTypes(VhdlVisitor):
     def visit_ComplexRegisterArray(self, node):
         """Generate the subsidary record and array type."""
         
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
         
         # Create a base record type.
         basename = 'tb_' + node.name
         self.printf('type {} is record', basename)
         for obj, _, _ in node.space.items():
-            self.printf('    {}: {};'.format(obj.identifier, self.namer(obj)))
+            self.print(f'    {obj.identifier}: {self.namer(obj)};')
         self.printf('end record {};', basename)
                     
         # And the array type.
@@ -259,7 +259,7 @@ class GenerateTypes(VhdlVisitor):
         # And the default array.
         self.printf('constant RESET_{0} : {0} := (others => (', self.namer(node))
         lines = (
-            '    {0} => RESET_{1}'.format(child.identifier, self.namer(child))
+            f'    {child.identifier} => RESET_{self.namer(child)}'
             for child, _, _ in node.space.items()
         )
         self.print(',\n'.join(lines))
@@ -269,7 +269,8 @@ class GenerateTypes(VhdlVisitor):
     def visit_SimpleRegisterArray(self, node):
         """Generate the array type."""
         
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
         child = next(obj for obj, _, _ in node.space.items())
         
         # Create the array type.
@@ -289,7 +290,8 @@ class GenerateTypes(VhdlVisitor):
         # Generate the record type.
         with self.tempvars(enumlines=[], registername=node.name):
             self.printf('type t_{name} is record', name=node.name)
-            self.visitchildren(node)
+            for _ in self.iterchildren(node):
+                pass
             self.printf('end record t_{name};', name=node.name)
         
             for line in self.enumlines:
@@ -300,8 +302,8 @@ class GenerateTypes(VhdlVisitor):
             self.namer(node)
         )
         lines = (
-            "    {} => '{}'".format(child.identifier, child.reset) if size==1 else
-            '    {} => "{:0{}b}"'.format(child.identifier, child.reset, size)
+            f"    {child.identifier} => '{child.reset}'" if size==1 else
+            f'    {child.identifier} => "{child.reset:0{size}b}"'
             for child, start, size in node.space.items()
         )
         self.print(',\n'.join(lines))
@@ -330,7 +332,8 @@ class GenerateTypes(VhdlVisitor):
         
         with self.tempvars(field=node, fieldtype=register_format(node)):
             self.printf('    {}: {};', node.identifier, self.fieldtype)
-            self.visitchildren(node)
+            for _ in self.iterchildren(node):
+                pass
         
     def visit_Enum(self, node):
         """Push enumeration values into the enum list."""
@@ -338,10 +341,9 @@ class GenerateTypes(VhdlVisitor):
         enumname = self.registername + '_' + self.field.name + '_' + node.name
         quote = '"' if self.field.width > 1 else "'"
         self.enumlines.append(
-            'constant {name}: {type} := {quote}{val:0{width}b}{quote};'.format(
-                name = enumname, type = self.fieldtype, quote = quote,
-                val = node.value, width = self.field.width
-        ))
+            f'constant {enumname}: {self.fieldtype} := '
+            f'{quote}{node.value:0{self.field.width}b}{quote};'
+        )
             
     def visit_MemoryMap(self, node):
         pass
@@ -351,14 +353,16 @@ class GenerateFunctionDeclarations(VhdlVisitor):
     
     def visit_Component(self, node):
         self.print(commentblock('Accessor Functions'))
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
         self.printf(self.rt('fndecl_component'), name=node.name)
             
     def visit_RegisterArray(self, node):
         self.print(
             self.template('fndecl_registerarray.j2').render(node=node)
         )
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
     
     def visit_Register(self, node):
         # Register access functions
@@ -372,7 +376,8 @@ class GenerateFunctionBodies(VhdlVisitor):
         self.print(
             self.template('fnbody_component_top.j2').render(node = node)
         )
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
         self.print(
             self.template('fnbody_component_bottom.j2').render(node = node)
         )
@@ -380,7 +385,8 @@ class GenerateFunctionBodies(VhdlVisitor):
     def visit_RegisterArray(self, node):
         """Register array access function bodies."""
 
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
         if node.space.itemcount > 1:
             self.print(
                 self.template('fnbody_registerarray_complex.j2').render(node=node)
@@ -400,7 +406,7 @@ class GenerateFunctionBodies(VhdlVisitor):
             if size == 1:
                 return str(start)
             else:
-                return '{} downto {}'.format(start+size-1, start)
+                return f'{start+size-1} downto {start}'
         
         def extractor(space, allow_readOnly):
             for obj, start, size in space.items():
@@ -428,14 +434,14 @@ class GenerateFunctionBodies(VhdlVisitor):
         """Print register access function bodies."""
             
         byte = [
-            '{} downto {}'.format(min(low+7, node.width-1), low)
+            f'{min(low+7, node.width-1)} downto {low}'
             for low in range(0, node.width, 8)
         ]
         self.print(
             self.template('fnbody_register_simple.j2').render(
                 name=node.name,
                 subtype=register_format(node, index=False),
-                srcrange='{} downto 0'.format(node.width-1),
+                srcrange=f'{node.width-1} downto 0',
                 byte=byte
         ))
 
@@ -476,27 +482,27 @@ class Vhdl(VhdlVisitor):
     def printlibraries(self):
         packages = sorted(self.use_packages)
         lib = None
+        lines = []
         for p in packages:
             newlib = p.split('.', maxsplit=1)[0]
             if newlib != lib:
                 lib = newlib
                 if lib != 'work':
-                    self.printf('library {};', lib)
-            self.printf('use {};', p)
+                    lines.append(f'library {lib};')
+            lines.append(f'use {p};')
+        self.print('\n'.join(lines))
             
     def visit_Component(self, node):
         """Create a VHDL file for a Component."""
         
         # Comments, libraries, and boilerplate.
         
-        wrapper = textwrap.TextWrapper()
-        
         self.pkgname = 'pkg_' + node.name
         header = self.rt('header_component').format(
             name = node.name,
-            desc = '\n\n'.join(wrapper.fill(d) for d in node.description),
+            desc = textfn.wrapped_description_block(node, wrapper),
             source = node.sourcefile,
-            time = datetime.datetime.now(),
+            time = start_time,
             pkg = self.pkgname,
             changes = self.changes
         )
@@ -566,12 +572,11 @@ class VhdlAxi4Lite(Visitor):
                 .format(node.name, node.width)
             )
         
-        wrapper = textwrap.TextWrapper()
         header = self.rt('header_component').format(
             name = node.name,
-            desc = '\n\n'.join(wrapper.fill(d) for d in node.description),
+            desc = textfn.wrapped_description_block(node, wrapper),
             source = node.sourcefile,
-            time = datetime.datetime.now(),
+            time = start_time,
             changes = self.changes
         )
         self.print(commentblock(header))
@@ -615,7 +620,7 @@ class VhdlWishboneAsync(Visitor):
         self.print(body.render(
             node = node,
             changes = self.changed_nodes,
-            time = datetime.datetime.now(),
+            time = start_time,
         ))
         
     def visit_MemoryMap(self, node):
@@ -624,7 +629,8 @@ class VhdlWishboneAsync(Visitor):
         
         # Build up the self.instances array.
         self.instances = []
-        self.visitchildren(node)
+        for _ in self.iterchildren(node):
+            pass
         
         # We can only work with arrays where all the datawidths are the same
         datawidths = set(c.binding.width for c in self.instances)
@@ -638,7 +644,7 @@ class VhdlWishboneAsync(Visitor):
             instances = self.instances,
             datawidth = datawidth,
             changes = self.changed_nodes,
-            time = datetime.datetime.now(),
+            time = start_time,
         ))
 
     def visit_Instance(self, node):
@@ -2,13 +2,13 @@
 
 from os import makedirs
 import os.path
-import datetime
 import textwrap
-from lxml.builder import E
-from lxml.etree import tostring, Comment
+from lxml import etree
+from lxml.etree import Comment
 
 from ..visitor import Visitor
-from ..util import Outputs
+from ..textfn import wrapped_description
+from ..util import Outputs, start_time
 
 wrapper = textwrap.TextWrapper()
 
@@ -31,31 +31,31 @@ class HtiXml(Visitor):
         self.header = Comment(
             "Generated automatically from {source} at {time:%d %b %Y %H:%M}.".format(
                 source = startnode.sourcefile,
-                time = datetime.datetime.now()
+                time = start_time
         ))
     
     def defaultvisit(self, node):
-        xmlnode = E(
-            type(node).__name__.lower(),
-        )
+        # Talk straight to etree rather than going through the ElementMaker;
+        # SubElement binds to the C implementation without a Python wrapper
+        # call per element.
+        xmlnode = etree.Element(node._xmltag)
         xmlnode.attrib.update(
             (k, str(v))
                 for k, v in node._attrib.items()
                 if v is not None
         )
-        xmlnode.extend(
-            E.description(
-                wrapper.fill(d)
-            ) for d in node.description
-        )
+        for d in wrapped_description(node, wrapper):
+            desc = etree.SubElement(xmlnode, 'description')
+            desc.text = d
         xmlnode.extend(self.visitchildren(node))
         return xmlnode
         
     def finish(self, tree):
         tree.insert(0, self.header)
-        self.write(
-            tostring(
-                tree,
-                xml_declaration=True, pretty_print=True,
-                encoding = 'UTF-8'
-        ))
+        # Stream straight to the output file rather than serializing the
+        # whole document into one bytes object first.
+        etree.ElementTree(tree).write(
+            self.output,
+            xml_declaration=True, pretty_print=True,
+            encoding = 'UTF-8'
+        )
@@ -48,7 +48,11 @@ class PlacedObject:
         start (int): The starting location in the Space.
         size (int): The amount of the Space occupied by the object.
     """
-    
+
+    # Large maps create one of these per register and gap; slots keep
+    # them small and make the attribute reads cheaper.
+    __slots__ = ('obj', 'start', 'size')
+
     def __init__(self, obj, start, size):
         self.obj = obj
         self.start = start
@@ -215,6 +219,7 @@ class Space:
         self._resizer = resizer.instance
         self._placer = placer.instance
         self._items = []
+        self._itemcache = None
     
     def __bool__(self):
         """True if there are any true items in the space."""
@@ -284,7 +289,12 @@ class Space:
         
     def items(self):
         """Iterate over all the actual items in the space."""
-        return (x for x in self if x)
+        # Output generators walk the same spaces repeatedly; cache the
+        # true items as a tuple and invalidate whenever _items changes.
+        cache = self._itemcache
+        if cache is None:
+            cache = self._itemcache = tuple(x for x in self if x)
+        return iter(cache)
     
     def addfloating(self, obj, size):
         """Try to find a place for this object and place it there."""
@@ -307,6 +317,7 @@ class Space:
         # One or the other should have always suceeded.
         assert(placement)
         self._items.insert(idx, placement)
+        self._itemcache = None
         return placement
             
     def addfixed(self, obj, size, start):
@@ -337,6 +348,7 @@ class Space:
                 assert(self.size >= newpo.end)
                 assert(self.lastgap().start <= newpo.start)
                 self._items.append(newpo)
+                self._itemcache = None
             except ValueError as e:
                 raise ValueError("Unable to resize from {1} for object ({0.size}@{0.start})".format(newpo, self.size))
         
@@ -358,6 +370,7 @@ class Space:
                             newpo, prev_item
                         ))
                     self._items.insert(idx, newpo)
+                    self._itemcache = None
                     break
             else:
                 raise RuntimeError('No exit from space loop.')
@@ -441,6 +454,7 @@ class Space:
         obj = copy(self)
         obj._start = start
         obj._end = stop
+        obj._itemcache = None
         return obj
         
     def __getitem__(self, idx):
@@ -29,6 +29,49 @@ if the truth of thy love to me were so righteously
 tempered as mine is to thee.
 """.strip()
 
+def wrapped_description(node, wrapper):
+    """Word-wrap a node's description paragraphs, with caching.
+
+    Several output generators wrap the same descriptions at the same
+    width; the results are cached on the node per wrapper width so each
+    wrap only happens once per run.
+
+    Args:
+        node: Any object with a .description list of paragraph strings.
+        wrapper: A textwrap.TextWrapper to fill paragraphs with.
+
+    Returns:
+        A tuple of wrapped paragraph strings.
+    """
+
+    try:
+        cache = node._wrapcache
+    except AttributeError:
+        cache = node._wrapcache = {}
+    try:
+        return cache[wrapper.width]
+    except KeyError:
+        wrapped = tuple(wrapper.fill(d) for d in node.description)
+        cache[wrapper.width] = wrapped
+        return wrapped
+
+def wrapped_description_block(node, wrapper):
+    """Like wrapped_description, but joined into one text block.
+
+    Paragraphs are still filled independently (joining first would let
+    the wrapper reflow across paragraph boundaries); only the final
+    '\\n\\n' join is done here, and the joined block is cached alongside
+    the per-paragraph form.
+    """
+
+    key = (wrapper.width, 'block')
+    try:
+        return node._wrapcache[key]
+    except (AttributeError, KeyError):
+        block = '\n\n'.join(wrapped_description(node, wrapper))
+        node._wrapcache[key] = block
+        return block
+
 def deflow(text, whitespace=None):
     """Unwordwrap text.
     
@@ -1,3 +1,4 @@
+import datetime
 import importlib
 import io
 import os.path
@@ -8,6 +9,10 @@ from functools import lru_cache
 
 from . import textfn
 
+# One timestamp for the whole run, so every generated file carries the
+# same time and the outputs don't each hit the clock.
+start_time = datetime.datetime.now()
+
 ######################################################################
 # Resource management
 
@@ -4,8 +4,6 @@ This class does almost all of the lifting for output generation.  It's super
 important; don't gloss this one over.
 """
 
-from io import IOBase
-from collections import ChainMap
 import sys
 from os import makedirs
 import os.path
@@ -40,7 +38,17 @@ class Visitor:
     binary = False
     encoding = None
     extension = ''
-    
+
+    # Buffer size for files we open ourselves.  Output is generated as many
+    # small print calls; a large buffer coalesces them into a handful of
+    # OS-level writes.
+    output_buffering = 1 << 16
+
+    # Directories we've already created this run, shared across all
+    # Visitors so each output directory costs one makedirs call rather
+    # than one per generated file.
+    _made_dirs = set()
+
     def __init__(self, output=None, directory=None):
         """Create this visitor bound to an output.
         
@@ -89,8 +97,10 @@ class Visitor:
         
         """
         self.printoptions = {}
+        self._printbase = None
         self._output = output
         self._directory = directory
+        self._ownoutput = False
         self.path = self.filename = self.output = None
     
     def _openfile(self):
@@ -100,9 +110,14 @@ class Visitor:
         Creates directories as needed.
         """
         mode = 'wb' if self.binary else 'w'
-        makedirs(self.path, exist_ok = True)
+        if self.path not in self._made_dirs:
+            makedirs(self.path, exist_ok = True)
+            self._made_dirs.add(self.path)
         fn = os.path.join(self.path, self.filename)
-        self.output = open(fn, mode, encoding=self.encoding)
+        self.output = open(fn, mode,
+            buffering=self.output_buffering, encoding=self.encoding
+        )
+        self._ownoutput = True
         printverbose(os.path.join(self.path, self.filename))
             
     def execute(self, startnode):
@@ -131,28 +146,45 @@ class Visitor:
             self.output = self._output
 
         # Now execute against the node.
-        self.begin(startnode)
-        return self.finish(self.visit(startnode))
+        try:
+            self.begin(startnode)
+            return self.finish(self.visit(startnode))
+        finally:
+            if self._ownoutput:
+                self.output.close()
     
     def visit(self, node):
         """Base visit operation.  This shouldn't need overloading."""
-        visitname = 'visit_' + type(node).__name__
+        # Node classes precompute their method name; fall back to building
+        # it for anything that doesn't.
+        visitname = getattr(node, '_visitname', None) or 'visit_' + type(node).__name__
         fn = getattr(self, visitname, self.defaultvisit)
         return fn(node)
         
     def visitchildren(self, node, reverse=False):
         """Visit all the children of this node.
-        
+
         Shouldn't need overloading, but this must be called explicitly.
-        
+
         Returns a list of all return values from all child nodes.
         """
-        
+
+        return list(self.iterchildren(node, reverse))
+
+    def iterchildren(self, node, reverse=False):
+        """Visit all the children of this node, yielding return values.
+
+        Like visitchildren, but lazy; use this when the results are
+        consumed one at a time (or not at all) to skip building the
+        intermediate list.
+        """
+
         if reverse:
             it = reversed(list(node.space.items()))
         else:
             it = node.space.items()
-        return [self.visit(obj) for obj, start, size in it]
+        for obj, start, size in it:
+            yield self.visit(obj)
         
     def defaultvisit(self, node):
         """Called when there is no explicit visitor for this node type."""
@@ -211,12 +243,19 @@ class Visitor:
     # Convenience output methods.
     def print(self, *args, **kwargs):
         """Prints to self.output
-        
+
         kwargs are as passed to the print statement.  They override arguments
         registered in self.printoptions (default is empty).
         """
-        
-        options = ChainMap(kwargs, self.printoptions, {'file' : self.output})
+
+        # Merging the option dicts per call adds up over tens of thousands
+        # of lines; keep a flattened copy and rebuild it only when the
+        # output target changes.
+        options = self._printbase
+        if options is None or options['file'] is not self.output:
+            options = self._printbase = {'file': self.output, **self.printoptions}
+        if kwargs:
+            options = {**options, **kwargs}
         print(*args, **options)
         
     def printf(self, formatstr, *args, printargs={}, **kwargs):
@@ -280,7 +319,9 @@ class Visitor:
     def preparedir(kls, directory):
         """Copy README.rst to the target directory."""
         
-        os.makedirs(directory, exist_ok=True)
+        if directory not in kls._made_dirs:
+            os.makedirs(directory, exist_ok=True)
+            kls._made_dirs.add(directory)
         target = os.path.join(directory, 'README.rst')
         printverbose(target)
         with open(target, 'w') as f:
@@ -45,11 +45,21 @@ May 31, 2011
 
 import re
 import os.path
-import glob
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from lxml import etree
-from collections import ChainMap
+from types import MappingProxyType
 from . import space
 
+# Leading blank lines on reStructuredText descriptions.
+_LEADING_BLANK_RE = re.compile(r'^(\s*\n)+')
+
+# One empty Space shared by all the leaf elements (see
+# HtiElement._skip_space).  Its NoPlacer/NoResizer reject any addition,
+# so it can never be accidentally mutated.
+_EMPTY_SPACE = space.Space(0)
+
 def ceildiv(a, b):
     """Returns ceil(a / b)."""
     return (a+b-1)//b
@@ -62,43 +72,82 @@ _tfmap = {
     '1' : True,
     '0' : False
 }
+# Seed the common spellings so tf() usually skips the .upper() call.
+_tfmap.update(
+    (k.lower(), v) for k, v in tuple(_tfmap.items())
+)
+_tfmap.update(
+    (k.title(), v) for k, v in tuple(_tfmap.items())
+)
 def tf(text):
     """Convert common string representations of true and false to bool."""
+    if isinstance(text, bool):
+        return text
+    if isinstance(text, int):
+        return bool(text)
     try:
-        return _tfmap[text.upper()]
+        return _tfmap[text]
     except KeyError:
-        raise ValueError('no boolean interpretation for ' + text)
-    except TypeError:
-        if isinstance(text, bool):
-            return text
-        elif isinstance(text, int):
-            return bool(text)
-        else:
-            raise
+        try:
+            return _tfmap[text.upper()]
+        except KeyError:
+            raise ValueError('no boolean interpretation for ' + text) from None
             
+# Map each legal format to its canonical module-level string, so every
+# element shares one object per format rather than holding the string
+# lxml allocated for it.
+_formats = {f : f for f in ('bits', 'signed', 'unsigned')}
+
 def _formatvalidator(text):
     """Confirms that text is a valid field format."""
-    if text not in ('bits', 'signed', 'unsigned'):
-        raise ValueError('illegal format ' + text)
-    return text
+    try:
+        return _formats[text]
+    except KeyError:
+        raise ValueError('illegal format ' + text) from None
 
 def toint(text):
     """str to int that accepts either decimal or "0x..." hex strings"""
-    return int(text, base=0)
+    s = text.strip()
+    t = s[1:] if s[:1] in '+-' else s
+    prefix = t[:2].lower()
+    if prefix == '0x':
+        return int(s, 16)
+    if prefix == '0b':
+        return int(s, 2)
+    if prefix == '0o':
+        return int(s, 8)
+    if t.startswith('0') and t != '0':
+        # Fall back to base-0 so bare leading zeros are rejected just
+        # as they always were.
+        return int(s, 0)
+    return int(s, 10)
+
+class _Inherit:
+    """Callable default that reads an attribute from the element's parent.
+
+    A slotted class instead of a closure, so all the inherited defaults
+    share one code object and carry nothing but the attribute name.
+    """
+
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __call__(self, element):
+        return getattr(element.parent, self.name, None)
 
 def inherit(fieldname):
-    """Create a function that returns *fieldname* from the parent object.
-    
+    """Create a callable that returns *fieldname* from the parent object.
+
     Example:
-    
+
         >>> defaults = {
         ...    'readOnly' : inherit('readOnly')
         ... }
-    
+
     """
-    def inheritor(self):
-        return getattr(self.parent, fieldname, None)
-    return inheritor
+    return _Inherit(fieldname)
 
 ########################################################################
 # XML Elements
@@ -126,6 +175,13 @@ class XmlError(Exception):
             self.msg
         )
 
+# Crossreference of XML tags to element classes.  Classes register
+# themselves here as they are defined (see HtiElement.__init_subclass__),
+# so the table also stays correct for subclasses defined at runtime.
+# Everything else reads it through the frozen _classes_by_name view.
+_classregistry = {}
+_classes_by_name = MappingProxyType(_classregistry)
+
 class HtiElement():
     """Abstract base class for all elements.
     
@@ -199,7 +255,50 @@ class HtiElement():
     textasdesc = True
     ischild = True
     isarray = False
-    
+    # Set True on leaf classes that never hold children; they share one
+    # empty Space instead of allocating their own.
+    _skip_space = False
+
+    def __init_subclass__(cls, **kwargs):
+        """Precompute per-class constants.
+
+        _visitname is the method name Visitors dispatch on; _xmltag is
+        the element tag to use when writing the node back out as XML.
+        Computing these once per class keeps them off the per-node hot
+        path.
+        """
+        super().__init_subclass__(**kwargs)
+        cls._visitname = 'visit_' + cls.__name__
+        cls._xmltag = cls.__name__.lower()
+        cls._buildattrtables()
+        # Self-register for tag dispatch; underscore classes are
+        # abstract bases that never appear in the XML.
+        if not cls.__name__.startswith('_'):
+            _classregistry[sys.intern(cls._xmltag)] = cls
+
+    @classmethod
+    def _buildattrtables(cls):
+        """Flatten the attribute maps into per-class dicts.
+
+        _processattributes used to layer required/optional/_required/
+        _optional through ChainMaps per instance; merging them once per
+        class makes each attribute a single flat dict probe.  Later
+        entries win, so the merge order mirrors the old ChainMap
+        precedence (required over optional over the underscore bases).
+        """
+        cls._typemap = MappingProxyType({
+            **cls._optional, **cls._required, **cls.optional, **cls.required
+        })
+        cls._requiredmap = MappingProxyType({**cls._required, **cls.required})
+        cls._defaultmap = MappingProxyType({**cls._defaults, **cls.defaults})
+        cls._optionalmap = MappingProxyType({**cls._optional, **cls.optional})
+        cls._optionalkeys = tuple(cls._optionalmap)
+        # Knowing up front which defaults are callable keeps try/except
+        # TypeError out of the per-attribute loop.
+        cls._callabledefaults = frozenset(
+            k for k, v in cls._defaultmap.items() if callable(v)
+        )
+
     def __init__(self, xml_element, parent=None, sourcefile='unknown file'):
         """Derive an HtiElement from an XML element.
         
@@ -219,21 +318,35 @@ class HtiElement():
             self._processattributes(xml_element)
             self._processchildren(xml_element)
         except (KeyError, ValueError, AttributeError, IndexError) as e:
-            #import traceback
-            #traceback.print_exc()
             raise XmlError(str(e), xml_element, self.sourcefile) from e
+
+        # Promote the resolved attributes to real instance attributes so
+        # the heavy read traffic during output generation skips the
+        # __getattr__ fallback.  _attrib remains the canonical store;
+        # anything that changes it after this point (see place) has to
+        # keep the two in step.
+        self.__dict__.update(self._attrib)
+
+        # Every attribute, child, and description string has been
+        # extracted by now; let libxml2 free the subtree immediately
+        # instead of holding the whole document until the tree goes
+        # away.  Tails are consumed by the parent before the child is
+        # constructed, so clearing them too is safe.
+        xml_element.clear()
     
     def _processattributes(self, xmlelement):
         """Attribute processing portion of initialization.""" 
         
-        cm = ChainMap(self.required, self.optional, self._required, self._optional)
+        typemap = self._typemap
         self._attrib = attrib = {}
-        
-        # Read in all of the attributes present.
+
+        # Read in all of the attributes present.  lxml hands us a fresh
+        # string for each attribute name; interning shares one copy of
+        # 'offset', 'size', etc. across every element in the run.
         for k, v in xmlelement.items():
             try:
-                targettype = cm[k]
-                attrib[k] = targettype(v)
+                targettype = typemap[k]
+                attrib[sys.intern(k)] = targettype(v)
             except KeyError:
                 raise KeyError("attribute {} not supported on element {}".format(
                     k, xmlelement.tag
@@ -242,23 +355,21 @@ class HtiElement():
                 raise ValueError("cannot make {}='{}' into {}".format(
                     k, v, targettype.__name__
                 ))
-            
+
         # Make sure we got all of the required attributes.
-        requiremap = ChainMap(self.required, self._required)
-        for k in requiremap:
-            if k not in attrib and requiremap[k] is not None:
+        for k, t in self._requiredmap.items():
+            if k not in attrib and t is not None:
                 raise AttributeError('required attribute {} not present'.format(k))
-                
+
         # Make sure we got all of the optional attributes, pulling in
         # defaults (and callable defaults) as needed.
-        defaultmap = ChainMap(self.defaults, self._defaults)
-        for k in ChainMap(self.optional, self._optional):
+        defaultmap = self._defaultmap
+        callabledefaults = self._callabledefaults
+        for k in self._optionalkeys:
             if k not in attrib:
-                try:
-                    d = defaultmap.get(k, None)
+                d = defaultmap.get(k, None)
+                if k in callabledefaults:
                     d = d(self)
-                except TypeError:
-                    pass
                 attrib[k] = d
         
         # Check for any invalid values on the common ones
@@ -278,19 +389,26 @@ class HtiElement():
         """Child element processing portion of initialization."""
         
         self.beforechildren()
-        self.space = space.Space(
-            self.space_size, self.space_resizer, self.space_placer
-        )
+        if self._skip_space:
+            # Safe to share: NoPlacer rejects any attempt to add to it.
+            self.space = _EMPTY_SPACE
+        else:
+            self.space = space.Space(
+                self.space_size, self.space_resizer, self.space_placer
+            )
         self._description = []
         self._textdesc(xml_element.text)
                
         unplaced_children = []
+        add = self.space.add
+        textdesc = self._textdesc
+        sourcefile = self.sourcefile
         for xmlchild in xml_element:
-            self._textdesc(xmlchild.tail)
-            
+            textdesc(xmlchild.tail)
+
             # Create a new child element
             kls = _classlookup(xmlchild.tag)
-            htichild = kls(xmlchild, parent=self, sourcefile=self.sourcefile)
+            htichild = kls(xmlchild, parent=self, sourcefile=sourcefile)
             if htichild.ischild:
                 # We want to place everything with an explicitly specified
                 # offset first, then let the unplaced things fill in the
@@ -298,28 +416,38 @@ class HtiElement():
                 if htichild.offset is None:
                     unplaced_children.append(htichild)
                 else:
-                    po = self.space.add(htichild, htichild.size, htichild.offset)
+                    po = add(htichild, htichild.size, htichild.offset)
                     htichild.place(po)
-        
+
         for htichild in unplaced_children:
             # Pick up the ones that didn't have explicit placement.
-            po = self.space.add(htichild, htichild.size, htichild.offset)
+            po = add(htichild, htichild.size, htichild.offset)
             htichild.place(po)
         
         self.afterchildren()
         if self.size is None:
             self._attrib['size'] = self.space.size
-        if (self.readOnly is None) and self.space.itemcount:
-            self._attrib['readOnly'] = all(obj.readOnly for obj, _, _ in self.space.items())
-        if (self.writeOnly is None) and self.space.itemcount:
-            self._attrib['writeOnly'] = all(obj.writeOnly for obj, _, _ in self.space.items())
+        inherit_ro = self.readOnly is None
+        inherit_wo = self.writeOnly is None
+        if (inherit_ro or inherit_wo) and self.space:
+            # Infer both flags from the children in one pass.
+            ro = wo = True
+            for obj, _, _ in self.space.items():
+                ro = ro and bool(obj.readOnly)
+                wo = wo and bool(obj.writeOnly)
+                if not (ro or wo):
+                    break
+            if inherit_ro:
+                self._attrib['readOnly'] = ro
+            if inherit_wo:
+                self._attrib['writeOnly'] = wo
         
     def _adddesc(self, text):
         """Append a description element, cleaning whitespace."""
         if text:
-            text = text.strip()
-            text = re.sub('\s+', ' ', text)
-            self._description.append(text)
+            # split()/join collapses (and strips) all runs of whitespace
+            # in one C pass, without the regex machinery.
+            self._description.append(' '.join(text.split()))
         
     def _textdesc(self, text):
         """Append descriptive text, cleaning whitespace.
@@ -328,11 +456,14 @@ class HtiElement():
         ------
         ValueError: textasdesc is False.
         """
-        if text:
-            if self.textasdesc:
-                self._adddesc(text)
-            else:
-                raise ValueError('unexpected free text')
+        # In indented XML nearly every text/tail node is pure
+        # whitespace; bail out before any stripping or splitting.
+        if not text or text.isspace():
+            return
+        if self.textasdesc:
+            self._adddesc(text)
+        else:
+            raise ValueError('unexpected free text')
         
     def beforechildren(self):
         """Hook to modify the object before the Space is created and filled."""
@@ -354,7 +485,7 @@ class HtiElement():
         """
         assert(po.size == self.size)
         if self._attrib['offset'] is None:
-            self._attrib['offset'] = po.start
+            self._attrib['offset'] = self.offset = po.start
     
     def __getattr__(self, attr):
         try:
@@ -380,6 +511,10 @@ class HtiElement():
             for line in text.splitlines():
                 yield line
         
+# __init_subclass__ only fires for subclasses; give the (abstract) base
+# its own tables for completeness.
+HtiElement._buildattrtables()
+
 class Description:
     """Defines a Description element, which is a child of practically
     any HtiElement.
@@ -393,7 +528,8 @@ class Description:
     # an __init__ with the same prototype and the ischild element.
     
     ischild = False
-    
+    __slots__ = ()
+
     def __init__(self, xml_element, parent, sourcefile='unknown file'):
         if len(xml_element):
             raise ValueError('description element cannot have children')
@@ -414,13 +550,14 @@ class RstDescription:
     # an __init__ with the same prototype and the ischild element.
     
     ischild = False
-    
+    __slots__ = ('_text',)
+
     def __init__(self, xml_element, parent, sourcefile='unknown file'):
         if len(xml_element):
             raise ValueError('description element cannot have children')
-        
-        # Strip leading blank lines and trailing whitespace.    
-        text = re.sub(r'^(\s*\n)+', '', xml_element.text)
+
+        # Strip leading blank lines and trailing whitespace.
+        text = _LEADING_BLANK_RE.sub('', xml_element.text)
         text = text.rstrip()
         self._text = text
         parent._description.append(self)
@@ -472,7 +609,8 @@ class Instance(HtiElement):
     def minimumSize(self):
         """Round up the instance size to the MemoryMap spacing."""
         spacing = self.parent.spacing
-        size = self.binding.size * (self.binding.width // 8)
+        binding = self.binding
+        size = binding.size * (binding.width // 8)
         n_spaces = (size + spacing - 1) // spacing
         return n_spaces * spacing
     
@@ -486,9 +624,13 @@ class Instance(HtiElement):
         'size' : minimumSize
     }
     
-    @property
+    @cached_property
     def binding(self):
-        """Return the Component that this is an Instance of."""
+        """Return the Component that this is an Instance of.
+
+        Cached: the component table never rebinds a name once the
+        instance exists, and downstream code reads this repeatedly.
+        """
         name = self._attrib.get('extern', self.name)
         return self._components[name]
         
@@ -549,9 +691,12 @@ class Register(HtiElement):
         """Propagate field reset values up, just for fun."""
         
         if self.space:
-            self._attrib['reset'] = sum(
-                (obj.reset << start) for obj, start, size in self.space.items()
-            )
+            # Fields can't overlap, so OR-ing the shifted resets together
+            # is the same sum without generator and addition overhead.
+            reset = 0
+            for obj, start, size in self.space.items():
+                reset |= obj.reset << start
+            self._attrib['reset'] = reset
         
 class Field(HtiElement):
     """Fields represent bit fields and contained within Registers.
@@ -576,7 +721,7 @@ class Field(HtiElement):
             self.space_size = None
             self.space_resizer = space.LinearResizer
         else:
-            self.space_size = 2**self.size
+            self.space_size = 1 << self.size
             
     def afterchildren(self):
         """Take size from the children if necessary."""
@@ -623,7 +768,8 @@ class Enum(HtiElement):
     
     size = 1
     space_size = 0
-    
+    _skip_space = True
+
     def place(self, po):
         if self.value is None:
             self.offset = self.value = po.start
@@ -659,11 +805,14 @@ class _Array(HtiElement):
             self._attrib['framesize'] = self.space.size
             
         if self.name is None:
-            children = list(self.space.items())
-            if len(children) == 1:
-                self._attrib['name'] = children[0].obj.name
-            else:
+            # Nameless arrays take their single child's name; peel off
+            # two items rather than listing the whole space to find out
+            # whether there's exactly one.
+            it = iter(self.space.items())
+            first = next(it, None)
+            if first is None or next(it, None) is not None:
                 raise ValueError('Array with more than one contained element needs a name.')
+            self._attrib['name'] = first.obj.name
                 
         self._attrib['size'] = self.framesize * self.count
         
@@ -675,14 +824,28 @@ class RegisterArray(_Array):
     def width(self):
         return self.parent.width
 
-# Build a dict crossreferencing XML tags to HtiElement subclasses.
-_classes_by_name = { c.__name__.lower() : c for c in HtiElement.__subclasses__() }
-_classes_by_name.update((c.__name__.lower(), c) for c in _Array.__subclasses__())
-_classes_by_name['desc'] = Description
-_classes_by_name['rstdesc'] = RstDescription
-_classes_by_name['description'] = Description
+# Description and RstDescription aren't HtiElements, so they register
+# by hand, along with the abbreviated desc/rstdesc spellings.
+_classregistry['desc'] = Description
+_classregistry['rstdesc'] = RstDescription
+_classregistry['description'] = Description
+
 def _classlookup(name):
-    return _classes_by_name[name]
+    """Map an XML tag to its element class.
+
+    The overwhelmingly common case is a bare lowercase tag, which is a
+    single dict hit; namespaced or oddly-cased tags are normalized and
+    retried before giving up.
+    """
+    try:
+        return _classes_by_name[name]
+    except KeyError:
+        pass
+    stripped = name.rpartition('}')[2].lower()
+    try:
+        return _classes_by_name[stripped]
+    except KeyError:
+        raise KeyError('unknown element {}'.format(name)) from None
 
 ########################################################################
 # XML File Parser
@@ -701,8 +864,24 @@ class XmlParser:
             
     def _readXml(self, filename):
         """Retreive an ElementTree from a filename."""
-        parser = etree.XMLParser(remove_comments=True, remove_pis=True)
+        # Register-map XML uses no IDs, entities, or DTDs; turning the
+        # bookkeeping for them off saves work per element and keeps the
+        # parser from ever touching the network.
+        parser = etree.XMLParser(
+            remove_comments=True, remove_pis=True,
+            collect_ids=False, resolve_entities=False, no_network=True
+        )
         return etree.parse(filename, parser)
+
+    @staticmethod
+    def _findXmlFiles(path):
+        """List all the .xml files under path, recursively."""
+        return [
+            os.path.join(p, f)
+                for p, s, files in os.walk(path)
+                for f in files
+                if f.casefold().endswith('.xml')
+        ]
         
     def analyzeDirectory(self, path):
         """Parse all .xml file in a directory.
@@ -719,23 +898,20 @@ class XmlParser:
         # Figure out which files code components and which code
         # memorymaps.
         #
-        files = (
-            os.path.join(p, f)
-                for p, s, files in os.walk(path)
-                for f in files
-                if f.casefold().endswith('.xml')
-        )
+        files = self._findXmlFiles(path)
         treesorter = {
             'component' : self.componentxml,
             'memorymap' : self.mmxml
         }
-        for fn in files:
-            try:
-                t = self._readXml(fn)
-                tag = t.getroot().tag
-                treesorter[tag].append((fn, t))
-            except KeyError:
-                raise XmlError('document root must be component or memorymap', t, fn)
+        # libxml2 releases the GIL while it parses, so reading the files
+        # through a thread pool scales with core count.  map keeps the
+        # results in filename order.
+        with ThreadPoolExecutor() as executor:
+            for fn, t in zip(files, executor.map(self._readXml, files)):
+                try:
+                    treesorter[t.getroot().tag].append((fn, t))
+                except KeyError:
+                    raise XmlError('document root must be component or memorymap', t, fn)
     
     def elaborate(self):
         """Translates XML into HtiElements.
@@ -746,36 +922,59 @@ class XmlParser:
         
         # Translate the components
         for fn, c in self.componentxml:
-            comp = Component(c.getroot(), parent=None, sourcefile=fn)
-            if comp.name in self.components:
-                raise ValueError(
-                    'Multiple definitions for component {}, {} and {}'.format(
-                        comp.name,
-                        self.components[comp.name].sourcefile,
-                        comp.sourcefile
-                    ))
-            self.components[comp.name] = comp
-        
+            self._elaborateComponent(fn, c)
+
         # Translate the memorymaps
         for fn, m in self.mmxml:
-            mm = MemoryMap(m.getroot(), components=self.components, sourcefile=fn)
-            if mm.name in self.memorymaps:
-                raise ValueError(
-                    'Multiple definitions for memorymap {}, {} and {}'.format(
-                        mm.name,
-                        self.memorymaps[mm.name].sourcefile,
-                        mm.sourcefile
-                    ))
-            self.memorymaps[mm.name] = mm
-        
+            self._elaborateMemoryMap(fn, m)
+
         self.componentxml.clear()
         self.mmxml.clear()
-        
+
+    def _elaborateComponent(self, fn, tree):
+        comp = Component(tree.getroot(), parent=None, sourcefile=fn)
+        if comp.name in self.components:
+            raise ValueError(
+                'Multiple definitions for component {}, {} and {}'.format(
+                    comp.name,
+                    self.components[comp.name].sourcefile,
+                    comp.sourcefile
+                ))
+        self.components[comp.name] = comp
+
+    def _elaborateMemoryMap(self, fn, tree):
+        mm = MemoryMap(tree.getroot(), components=self.components, sourcefile=fn)
+        if mm.name in self.memorymaps:
+            raise ValueError(
+                'Multiple definitions for memorymap {}, {} and {}'.format(
+                    mm.name,
+                    self.memorymaps[mm.name].sourcefile,
+                    mm.sourcefile
+                ))
+        self.memorymaps[mm.name] = mm
+
     def processDirectory(self, path):
         """Parses all .xml files in a directory and turns then into HtiElements.
-        
+
         This combines analyzeDirectory and elaborate into one call for the
-        common case where all sources are in the same directory.
+        common case where all sources are in the same directory.  Unlike
+        running the two steps separately, components are elaborated (and
+        their XML trees dropped) as each parse finishes, so peak memory
+        is roughly one tree rather than the whole directory's worth.
         """
-        self.analyzeDirectory(path)
-        self.elaborate()
+        files = self._findXmlFiles(path)
+        with ThreadPoolExecutor() as executor:
+            for fn, t in zip(files, executor.map(self._readXml, files)):
+                tag = t.getroot().tag
+                if tag == 'component':
+                    self._elaborateComponent(fn, t)
+                elif tag == 'memorymap':
+                    # Memory maps need the complete component table, so
+                    # they have to wait for the end of the sweep.
+                    self.mmxml.append((fn, t))
+                else:
+                    raise XmlError('document root must be component or memorymap', t, fn)
+
+        for fn, t in self.mmxml:
+            self._elaborateMemoryMap(fn, t)
+        self.mmxml.clear()